@@ -24,6 +24,14 @@ DEFAULT_SSH_PRIVATE_KEY = '~/.ssh/id_rsa'
 # SSH reconnect attempts count
 SHELL_RECONNECT_RETRY = 3
 
+# Discovered host information can be cached in FACT_CACHE_DIR, so that host
+# discovery is skipped if the cached information is not older than
+# FACT_CACHE_TIMEOUT seconds. Value 0 disables the caching.
+FACT_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', '~/.cache'), 'kanzo', 'facts'
+)
+FACT_CACHE_TIMEOUT = 0
+
 # List of regular exceptions which are used to catch recognised errors from
 # Puppet logs
 PUPPET_ERRORS = [
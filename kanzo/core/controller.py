@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
 
 import collections
-import greenlet
+import gevent
+import gevent.queue
 import logging
 import os
 import tempfile
@@ -28,35 +29,66 @@ PluginData = collections.namedtuple(
         'clean_steps',
     ]
 )
+# Plugin module attributes loaded to PluginData fields following 'name'
+_PLUGIN_KEYS = (
+    'MODULES',
+    'RESOURCES',
+    'INITIALIZATION',
+    'PREPARATION',
+    'DEPLOYMENT',
+    'CLEANUP',
+)
 
 
 def wait_for_runners(runners):
-    """Switches between given set of runners until all are finished."""
-    while runners:
-        LOG.debug(
-            'Checking greenlets: {runners}'.format(**locals())
+    """Waits until all given runners are finished. If any of the runners
+    fails, remaining runners are killed and the error is re-raised.
+    """
+    LOG.debug('Waiting for greenlets: {runners}'.format(**locals()))
+    try:
+        gevent.joinall(runners, raise_error=True)
+    except Exception:
+        LOG.debug('Killing greenlets: {runners}'.format(**locals()))
+        gevent.killall(runners)
+        raise
+
+
+def _noop(*args, **kwargs):
+    """Default status callback which ignores all events."""
+
+
+# Loaded plugin modules and their PluginData, shared by all controllers
+_PLUGIN_CACHE = None
+
+
+def load_plugin_data():
+    """Returns tuple of loaded plugin modules and tuple of PluginData built
+    from them. The result is cached until Controller.invalidate_plugin_cache
+    is called.
+    """
+    global _PLUGIN_CACHE
+    if _PLUGIN_CACHE is not None:
+        return _PLUGIN_CACHE
+    plugin_modules = plugins.load_all_plugins()
+    plugin_data = []
+    for plug in plugin_modules:
+        # load plugin data, missing attributes share the empty tuple
+        plugin_data.append(
+            PluginData(
+                plug.__name__,
+                *(tuple(getattr(plug, key, ())) for key in _PLUGIN_KEYS)
+            )
         )
-        for run in list(runners):
-            if run.dead:
-                runners.remove(run)
-                LOG.debug('Greenlet {run} is dead.'.format(**locals()))
-            else:
-                try:
-                    LOG.debug('Greenlet {run} is alive.'.format(**locals()))
-                    run.switch()
-                except Exception:
-                    # kills remaining greenlets
-                    for i in runners:
-                        LOG.debug('Killing greenlet: {}'.format(i))
-                        i.throw()
-                    raise
+        LOG.debug('Loaded plugin {0}'.format(plug))
+    _PLUGIN_CACHE = (tuple(plugin_modules), tuple(plugin_data))
+    return _PLUGIN_CACHE
 
 
 class Controller(object):
     """Master class which is driving the installation process."""
     def __init__(self, config, work_dir=None, remote_tmpdir=None,
                  local_tmpdir=None):
-        self._callbacks = {}
+        self._status_cb = _noop
         self._messages = []
 
         work_dir = work_dir or conf.project.PROJECT_TEMPDIR
@@ -65,31 +97,25 @@ class Controller(object):
         os.makedirs(local_tmpdir, mode=0o700, exist_ok=True)
 
         # load config files
-        self._plugin_modules = plugins.load_all_plugins()
+        self._plugin_modules, self._plugins = load_plugin_data()
         self._config = self.build_config_obj(config, self._plugin_modules)
 
-        # load all relevant information from plugins
-        self._plugins = []
-        for plug in self._plugin_modules:
-            # load plugin data
-            self._plugins.append(
-                PluginData(
-                    name=plug.__name__,
-                    modules=getattr(plug, 'MODULES', []),
-                    resources=getattr(plug, 'RESOURCES', []),
-                    init_steps=getattr(plug, 'INITIALIZATION', []),
-                    prep_steps=getattr(plug, 'PREPARATION', []),
-                    plan_steps=getattr(plug, 'DEPLOYMENT', []),
-                    clean_steps=getattr(plug, 'CLEANUP', []),
-                )
-            )
-            LOG.debug('Loaded plugin {0}'.format(plug))
+        # steps of all plugins for each phase
+        self._phase_steps = {
+            phase: [
+                step
+                for plugin in self._plugins
+                for step in getattr(plugin, '{}_steps'.format(phase))
+            ]
+            for phase in ('init', 'prep', 'plan', 'clean')
+        }
 
         # creates drone for each deploy host
         self._drones = {}
         self._info = {}
         for host in utils.config.get_hosts(self._config):
-            # connect to host to solve ssh keys as first step
+            # connect to host to solve ssh keys as first step, this has to
+            # run serially as registering ssh-key might ask for password
             utils.shell.RemoteShell(host)
             self._drones[host] = drones.Drone(
                 host, self._config, self._messages,
@@ -97,10 +123,11 @@ class Controller(object):
                 remote_tmpdir=remote_tmpdir,
                 local_tmpdir=local_tmpdir,
             )
+        self._drones_list = tuple(self._drones.values())
 
         # register resources and modules to drones
-        for plug in self._plugins:
-            for drone in self._drones:
+        for drone in self._drones_list:
+            for plug in self._plugins:
                 for resource in plug.resources:
                     drone.add_resource(resource)
                 for module in plug.modules:
@@ -109,38 +136,48 @@ class Controller(object):
         # initialize plan for Puppet runs
         self._plan = {
             'manifests': collections.OrderedDict(),
-            'dependency': {},
+            'dependency': collections.defaultdict(set),
+            'dependents': collections.defaultdict(set),
             'waiting': set(),
             'in-progress': set(),
             'finished': set(),
         }
 
+    @classmethod
+    def invalidate_plugin_cache(cls):
+        """Reloads plugins, so that next created controller picks up
+        the changes made in them.
+        """
+        global _PLUGIN_CACHE
+        _PLUGIN_CACHE = None
+        plugins.reload_plugins()
+
     @classmethod
     def build_config_obj(cls, config_path, plugin_modules=None):
-        plugin_modules = plugins.load_all_plugins()
+        plugin_modules = plugin_modules or plugins.load_all_plugins()
         return conf.Config(
             config_path, plugins.meta_builder(plugin_modules)
         )
 
     def _iter_phase(self, phase):
-        for plugin in self._plugins:
-            for step in getattr(plugin, '{}_steps'.format(phase)):
-                yield step
+        return iter(self._phase_steps[phase])
 
     def _run_phase(self, phase, timeout=None, debug=False):
 
         def _install_puppet(drone):
-            parent = greenlet.getcurrent().parent
+            host = drone._shell.host
             drone.init_host()
-            parent.switch()
-            self._info[drone._shell.host] = drone.discover()
-            parent.switch()
+            if drone.load_cached_info():
+                self._status_cb('facts', host, 'cache_hit')
+            else:
+                drone.discover()
+            self._info[host] = drone.info
             drone.configure()
 
         # phase run
-        self._callbacks['status']('phase', phase, 'start')
+        self._status_cb('phase', phase, 'start')
         for step in self._iter_phase(phase):
-            self._callbacks['status'](
+            self._status_cb(
                 'step', step.__name__, 'start',
                 additional={'messages': self._messages}
             )
@@ -159,39 +196,35 @@ class Controller(object):
                     self._plan['manifests'].setdefault(marker, []).append(
                         (host, manifest)
                     )
-                    self._plan['dependency'].setdefault(marker, set()).update(
-                        prereqs or set()
-                    )
+                    self._plan['dependency'][marker].update(prereqs or ())
+                    for prereq in prereqs or ():
+                        self._plan['dependents'][prereq].add(marker)
             else:
-                runners = set()
-                for drone in self._drones.values():
-                    run = greenlet.greenlet(step)
-                    runners.add(run)
-                    run.switch(
+                wait_for_runners([
+                    gevent.spawn(
+                        step,
                         shell=drone._shell,
                         config=self._config,
                         info=drone.info,
                         messages=self._messages
                     )
-                wait_for_runners(runners)
-            self._callbacks['status']('step', step.__name__, 'end')
+                    for drone in self._drones_list
+                ])
+            self._status_cb('step', step.__name__, 'end')
         # phase post-run
-        runners = set()
-        for drone in self._drones.values():
-            if phase == 'init':
-                # install and configure Puppet on hosts and run discover
-                run = greenlet.greenlet(_install_puppet)
-                runners.add(run)
-                run.switch(drone)
-            elif phase == 'plan':
-                # prepare deployment builds
-                run = greenlet.greenlet(drone.make_build)
-                runners.add(run)
-                run.switch()
-            else:
-                break
-        wait_for_runners(runners)
-        self._callbacks['status']('phase', phase, 'end')
+        if phase == 'init':
+            # install and configure Puppet on hosts and run discover
+            wait_for_runners([
+                gevent.spawn(_install_puppet, drone)
+                for drone in self._drones_list
+            ])
+        elif phase == 'plan':
+            # prepare deployment builds
+            wait_for_runners([
+                gevent.spawn(drone.make_build)
+                for drone in self._drones_list
+            ])
+        self._status_cb('phase', phase, 'end')
 
     def run_init(self, timeout=None, debug=False):
         """Completely initialize and prepare deploy hosts
@@ -207,41 +240,77 @@ class Controller(object):
 
     def run_deployment(self, timeout=None, debug=False):
         """Run planned deployment."""
-        self._callbacks['status']('phase', 'deployment', 'start')
-        runners = {}
-        while self._plan['waiting'] or self._plan['in-progress']:
-            # initiate deployment
-            for marker, manifests in self._plan['manifests'].items():
-                # skip finished markers
-                if marker in self._plan['finished']:
-                    continue
-                # skip markers waiting for dependency
-                reqs = self._plan['dependency'][marker] - self._plan['finished']
-                if reqs:
-                    LOG.debug(
-                        'Marked deployment "{marker}" is waiting '
-                        'for prerequisite deployments to finish: '
-                        '{reqs}'.format(**locals())
-                    )
-                    continue
-                # initiate marker deployment
-                if marker not in runners:
-                    LOG.debug(
-                        'Initiating marked deployment: '
-                        '{marker}'.format(**locals())
+        self._status_cb('phase', 'deployment', 'start')
+        plan = self._plan
+        # fail early if any prerequisite is never going to be deployed
+        for marker, prereqs in plan['dependency'].items():
+            unplanned = prereqs.difference(plan['manifests'])
+            if unplanned:
+                unplanned = ', '.join(sorted(unplanned))
+                raise RuntimeError(
+                    'Marked deployment "{marker}" depends on prerequisite '
+                    'deployments which were not planned: '
+                    '{unplanned}'.format(**locals())
+                )
+        # count unfinished prerequisites of each marker, markers without
+        # any are ready to be deployed
+        indegree = {}
+        ready = collections.deque()
+        for marker in plan['manifests']:
+            if marker in plan['finished']:
+                continue
+            indegree[marker] = len(
+                plan['dependency'][marker] - plan['finished']
+            )
+            if not indegree[marker]:
+                ready.append(marker)
+        # running deployments and count of unfinished runners per marker,
+        # finished runners post themselves to the queue
+        pending, unfinished = {}, {}
+        done = gevent.queue.Queue()
+        while ready or pending:
+            # initiate deployment of all ready markers
+            while ready:
+                marker = ready.popleft()
+                LOG.debug(
+                    'Initiating marked deployment: {marker}'.format(**locals())
+                )
+                plan['waiting'].remove(marker)
+                plan['in-progress'].add(marker)
+                for host, manifest in plan['manifests'][marker]:
+                    run = gevent.spawn(
+                        self._drones[host].deploy, manifest,
+                        timeout=timeout, debug=debug
                     )
-                    self._plan['waiting'].remove(marker)
-                    self._plan['in-progress'].add(marker)
-                    for host, manifest in manifests:
-                        run = greenlet.greenlet(self._drones[host].deploy)
-                        runners.setdefault(marker, set()).add(run)
-                        run.switch(manifest, timeout=timeout, debug=debug)
-                wait_for_runners(runners[marker])
-                # check marker deployment end
-                if not runners[marker]:
-                    self._plan['finished'].add(marker)
-                    self._plan['in-progress'].remove(marker)
-        self._callbacks['status']('phase', 'deployment', 'end')
+                    run.link(done.put_nowait)
+                    pending[run] = marker
+                unfinished[marker] = len(plan['manifests'][marker])
+            # wait for any deployment to finish
+            run = done.get()
+            marker = pending.pop(run)
+            try:
+                run.get()
+            except Exception:
+                gevent.killall(list(pending))
+                raise
+            unfinished[marker] -= 1
+            if unfinished[marker]:
+                continue
+            # mark deployment finished and release its dependents
+            plan['finished'].add(marker)
+            plan['in-progress'].remove(marker)
+            for dependent in plan['dependents'].get(marker, ()):
+                indegree[dependent] -= 1
+                if not indegree[dependent]:
+                    ready.append(dependent)
+        if plan['waiting']:
+            # all prerequisites are planned, so the rest depend on each other
+            waiting = ', '.join(sorted(plan['waiting']))
+            raise RuntimeError(
+                'Marked deployments have cyclic dependency and cannot '
+                'be deployed: {waiting}'.format(**locals())
+            )
+        self._status_cb('phase', 'deployment', 'end')
 
     def run_cleanup(self):
         """Completely cleans deploy hosts
@@ -250,7 +319,7 @@ class Controller(object):
         directories are deleted.
         """
         self._run_phase('clean')
-        for drone in self._drones.values():
+        for drone in self._drones_list:
             drone.clean()
 
     def register_status_callback(self, callback, calltype='status'):
@@ -260,6 +329,10 @@ class Controller(object):
         Callback can accept parameter 'additional' which contains None or dict
         of additional data depending on unit_type.
         For 'status' callback parameter unit_type can contain values:
-            'phase', 'step', 'manifest'.
+            'phase', 'step', 'manifest', 'facts'.
         """
-        self._callbacks[calltype] = callback
+        if calltype != 'status':
+            raise ValueError(
+                'Unknown callback type: {calltype}'.format(**locals())
+            )
+        self._status_cb = callback
@@ -2,13 +2,15 @@
 
 import collections
 import datetime
-import greenlet
+import hashlib
+import json
 import logging
 import os
 import shutil
 import sys
 import tempfile
 import time
+import types
 
 from ..conf import project
 from .. import utils
@@ -33,7 +35,9 @@ class Drone(object):
         work_dir. Usually it's enough to set work_dir which is the local base
         directory for drone and rest is created automatically.
         """
-        self.info = {}
+        self._info = {}
+        # read-only view of the host information passed to plugin steps
+        self.info = types.MappingProxyType(self._info)
         self._modules = set()
         self._resources = set()
         self._hiera = set()
@@ -97,6 +101,66 @@ class Drone(object):
                 '{project.PUPPET_DEPENDENCY_COMMANDS}'.format(**locals())
             )
 
+    def _get_fact_cache_path(self):
+        # facts differ per connection and per project (custom facts),
+        # so both are part of the cache key
+        shell = self._shell
+        ident = '{shell.username}@{shell.host}:{shell.port}/{proj}'.format(
+            shell=shell,
+            proj=getattr(project, 'PROJECT', project.PROJECT_NAME)
+        )
+        return os.path.join(
+            utils.shortcuts.normalize_path(project.FACT_CACHE_DIR),
+            '{}-{}.json'.format(
+                shell.host, hashlib.sha1(ident.encode('utf-8')).hexdigest()[:8]
+            )
+        )
+
+    def load_cached_info(self):
+        """Loads information about the host from fact cache. Returns True
+        if the cache is enabled, fresh enough and readable, otherwise returns
+        False.
+        """
+        if not project.FACT_CACHE_TIMEOUT:
+            return False
+        path = self._get_fact_cache_path()
+        try:
+            age = time.time() - os.path.getmtime(path)
+        except OSError:
+            return False
+        if age > project.FACT_CACHE_TIMEOUT:
+            return False
+        LOG.debug(
+            'Loading info of host {self._shell.host} from fact cache '
+            '{path}.'.format(**locals())
+        )
+        try:
+            with open(path) as cache:
+                info = json.load(cache)
+        except (OSError, ValueError) as ex:
+            LOG.warning(
+                'Failed to load fact cache {path}, host {self._shell.host} '
+                'will be discovered: {ex}'.format(**locals())
+            )
+            return False
+        self._info.update(info)
+        return True
+
+    def _save_cached_info(self):
+        path = self._get_fact_cache_path()
+        cachedir = os.path.dirname(path)
+        os.makedirs(cachedir, mode=0o700, exist_ok=True)
+        # write to temporary file first, so interrupted run cannot leave
+        # half-written cache behind
+        fd, tmppath = tempfile.mkstemp(dir=cachedir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as cache:
+                json.dump(self._info, cache)
+            os.replace(tmppath, path)
+        except Exception:
+            os.unlink(tmppath)
+            raise
+
     def discover(self):
         """Load information about the host."""
         # Host self.info discovery
@@ -109,7 +173,16 @@ class Drone(object):
                 # this line is probably some warning, so let's skip it
                 continue
             else:
-                self.info[key.strip()] = value.strip()
+                self._info[key.strip()] = value.strip()
+        if project.FACT_CACHE_TIMEOUT:
+            try:
+                self._save_cached_info()
+            except OSError as ex:
+                # cache is only an optimisation, so do not fail discovery
+                LOG.warning(
+                    'Failed to save fact cache of host {self._shell.host}: '
+                    '{ex}'.format(**locals())
+                )
         return self.info
 
     def _create_remote_file(self, path, content):
@@ -188,11 +261,8 @@ class Drone(object):
         """Creates and transfers deployment build to remote temporary
         directory.
         """
-        parent = greenlet.getcurrent().parent
         LOG.debug('Creating build {self._local_builddir}.'.format(**locals()))
         self._create_build(self._local_builddir)
-        if parent:
-            parent.switch()
         LOG.debug(
             'Transferring build {self._local_builddir} for host '
             '{self._shell.host}.'.format(**locals())
@@ -280,14 +350,10 @@ class Drone(object):
                 )
                 self._transfer.receive(log, local_log)
             except ValueError:
-                # log does not exists which means apply did not finish yet
-                parent = greenlet.getcurrent().parent
-                if parent:
-                    parent.switch()
-                else:
-                    # for cases when deployment is not run in separate green
-                    # thread, we just wait sleep
-                    time.sleep(2)
+                # log does not exists which means apply did not finish yet,
+                # time.sleep is patched by gevent so other deployments
+                # can run meanwhile
+                time.sleep(2)
             else:
                 return puppet.LogChecker.validate(local_log)
 
@@ -41,6 +41,14 @@ def load_all_plugins():
     return _plugins
 
 
+def reload_plugins():
+    """Reloads all plugins specified by project's PLUGINS list"""
+    for plugin in _plugins:
+        importlib.reload(plugin)
+    del _plugins[:]
+    return load_all_plugins()
+
+
 def meta_builder(plugins):
     """This function is used for building meta dictionary for Config class.
     Input parameter should contain list of imported plugin modules."""
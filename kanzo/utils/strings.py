@@ -3,6 +3,7 @@
 from __future__ import (absolute_import, division,
                         print_function, unicode_literals)
 
+import functools
 import re
 
 
@@ -10,6 +11,12 @@ STR_MASK = '*' * 8
 COLORS = {'nocolor': "\033[0m", 'red': "\033[0;31m",
           'green': "\033[32m", 'blue': "\033[34m",
           'yellow': "\033[33m"}
+# precompiled color formats and pattern matching any color tag
+_COLOR_FMT = {
+    name: COLORS[name] + '{}' + COLORS['nocolor']
+    for name in ('red', 'green', 'blue', 'yellow')
+}
+_COLOR_RE = re.compile('|'.join(re.escape(i) for i in COLORS.values()))
 
 
 def color_text(text, color):
@@ -17,7 +24,27 @@ def color_text(text, color):
     Returns given text string with appropriate color tag. Allowed values
     for color parameter are 'red', 'blue', 'green' and 'yellow'.
     """
-    return '%s%s%s' % (COLORS[color], text, COLORS['nocolor'])
+    return _COLOR_FMT[color].format(text)
+
+
+@functools.lru_cache(maxsize=128)
+def _mask_pattern(mask_list, replace_list):
+    """Returns compiled pattern matching any of the transformed words
+    from mask_list or None if there is nothing to mask.
+    """
+    words = set()
+    for word in mask_list:
+        if not word:
+            continue
+        for before, after in replace_list:
+            word = word.replace(before, after)
+        words.add(word)
+    if not words:
+        return None
+    # longer words first, so overlapping words are masked whole
+    return re.compile(
+        '|'.join(re.escape(i) for i in sorted(words, key=len, reverse=True))
+    )
 
 
 def mask_string(unmasked, mask_list=None, replace_list=None):
@@ -27,26 +54,20 @@ def mask_string(unmasked, mask_list=None, replace_list=None):
     could be describe in replace list. For example [("'","'\\''")]
     replaces all ' characters with '\\''.
     """
-    mask_list = mask_list or []
-    replace_list = replace_list or []
-
-    masked = unmasked
-    for word in mask_list:
-        if not word:
-            continue
-        for before, after in replace_list:
-            word = word.replace(before, after)
-        masked = masked.replace(word, STR_MASK)
-    return masked
+    pattern = _mask_pattern(
+        tuple(mask_list or ()),
+        tuple(tuple(i) for i in replace_list or ())
+    )
+    if pattern is None:
+        return unmasked
+    return pattern.sub(STR_MASK, unmasked)
 
 
 def state_format(msg, state, color, offset=60):
     """
     Formats state with offset according to given message.
     """
-    _msg = '%s' % msg
-    for clr in COLORS.values():
-        _msg = re.sub(re.escape(clr), '', msg)
+    _msg = _COLOR_RE.sub('', '%s' % msg)
     space = offset - len(_msg) + len(state)
 
     state = '[ %s ]' % color_text(state, color)
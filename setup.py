@@ -16,7 +16,7 @@ setup(
     include_package_data=True,
     install_requires=[
         'paramiko',
-        'greenlet',
+        'gevent',
         'jinja2',
         'pyyaml',
     ],
@@ -93,6 +93,9 @@ class FakeRemoteShell(object):
     history = {}
     return_vals = {}
 
+    username = 'root'
+    port = 22
+
     def __init__(self, host):
         self.host = host
         self._client = Mock(
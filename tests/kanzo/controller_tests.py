@@ -5,14 +5,16 @@ from __future__ import (absolute_import, division,
 
 import os
 import sys
+import time
 
-from kanzo.core.controller import Controller
+from kanzo.core import controller
+from kanzo.core.controller import Controller, load_plugin_data
 from kanzo.core.main import simple_reporter
 from kanzo.utils import shell
 
 from ..plugins import sql
 from . import _KANZO_PATH, register_execute, check_history
-from . import BaseTestCase
+from . import BaseTestCase, FakeRemoteShell
 
 
 PUPPET_CONFIG = '''
@@ -104,3 +106,178 @@ class ControllerTestCase(BaseTestCase):
     def test_node_init(self):
         """[Controller] Test deployment execution."""
         self._controller.run_init(debug=True)
+
+    def test_deployment_order(self):
+        """[Controller] Test deployment respects marker dependency."""
+        self._controller.run_init(debug=True)
+        deployed = self._record_deploy()
+        self._controller.run_deployment()
+        self.assertEqual(
+            sorted(deployed[:2]), ['prerequisite_1', 'prerequisite_2']
+        )
+        self.assertEqual(deployed[2:], ['final'])
+        self.assertEqual(
+            self._controller._plan['finished'],
+            {'prerequisite_1', 'prerequisite_2', 'final'}
+        )
+
+    def test_resource_registration(self):
+        """[Controller] Test plugin resources are registered to drones."""
+        resource = os.path.join(self._tmpdir, 'resource_test.pem')
+        with open(resource, 'w') as res:
+            res.write('test')
+        modules, data = load_plugin_data()
+        data = (data[0]._replace(resources=(resource,)),) + data[1:]
+        controller._PLUGIN_CACHE = (modules, data)
+        try:
+            ctrl = Controller(
+                self._path, work_dir=self._tmpdir,
+                local_tmpdir=os.path.join(self._tmpdir, 'resources')
+            )
+        finally:
+            controller._PLUGIN_CACHE = None
+        self.assertTrue(ctrl._drones)
+        for drone in ctrl._drones.values():
+            self.assertEqual(drone._resources, {resource})
+
+    def test_phase_post_run(self):
+        """[Controller] Test Puppet installation and build run per host."""
+        self._controller.run_init(debug=True)
+        hosts = sorted(self._controller._drones)
+        self.assertEqual(sorted(self._controller._info), hosts)
+        for host in hosts:
+            history = [i.cmd for i in FakeRemoteShell.history[host]]
+            self.assertIn('facter -p', history)
+            self.assertTrue([i for i in history if ' -xpzf ' in i])
+
+    def test_phase_concurrency(self):
+        """[Controller] Test phase step runs on all hosts concurrently."""
+        events = []
+
+        def step(shell, config, info, messages):
+            events.append(('start', shell.host))
+            # time.sleep is patched by gevent, so other hosts run meanwhile
+            time.sleep(0.05)
+            events.append(('end', shell.host))
+
+        self._controller._phase_steps['prep'] = [step]
+        self._controller._run_phase('prep')
+        hosts = len(self._controller._drones)
+        self.assertEqual(len(events), 2 * hosts)
+        self.assertEqual(
+            [i[0] for i in events], ['start'] * hosts + ['end'] * hosts
+        )
+
+    def test_phase_failure(self):
+        """[Controller] Test failed step kills steps running on other hosts."""
+        failing = sorted(self._controller._drones)[0]
+        events = []
+
+        def step(shell, config, info, messages):
+            events.append(('start', shell.host))
+            if shell.host == failing:
+                time.sleep(0.01)
+                raise ValueError('Step failed on {}'.format(shell.host))
+            time.sleep(0.2)
+            events.append(('end', shell.host))
+
+        self._controller._phase_steps['prep'] = [step]
+        with self.assertRaisesRegex(ValueError, 'Step failed'):
+            self._controller._run_phase('prep')
+        # give killed step chance to finish if it was not killed
+        time.sleep(0.3)
+        self.assertEqual([i[0] for i in events], ['start', 'start'])
+
+    def _record_deploy(self):
+        deployed = []
+        for drone in self._controller._drones.values():
+            drone.deploy = (
+                lambda name, timeout=None, debug=False: deployed.append(name)
+            )
+        return deployed
+
+    def _record_timed_deploy(self, delays, failing=()):
+        events = []
+
+        def deploy(name, timeout=None, debug=False):
+            events.append(('start', name))
+            # time.sleep is patched by gevent, so other deployments run
+            time.sleep(delays[name])
+            if name in failing:
+                raise ValueError('Deployment {} failed'.format(name))
+            events.append(('end', name))
+
+        for drone in self._controller._drones.values():
+            drone.deploy = deploy
+        return events
+
+    def test_deployment_release(self):
+        """[Controller] Test dependent deployment starts right after its
+        prerequisites finish."""
+        self._controller.run_init(debug=True)
+        plan = self._controller._plan
+        # make final dependent only on the fast prerequisite_2
+        plan['dependency']['final'].discard('prerequisite_1')
+        plan['dependents']['prerequisite_1'].discard('final')
+        events = self._record_timed_deploy({
+            'prerequisite_1': 0.2, 'prerequisite_2': 0.01, 'final': 0.01
+        })
+        self._controller.run_deployment()
+        self.assertLess(
+            events.index(('end', 'final')),
+            events.index(('end', 'prerequisite_1'))
+        )
+        self.assertLess(
+            events.index(('end', 'prerequisite_2')),
+            events.index(('start', 'final'))
+        )
+
+    def test_deployment_failure(self):
+        """[Controller] Test failed deployment kills running deployments."""
+        self._controller.run_init(debug=True)
+        events = self._record_timed_deploy(
+            {'prerequisite_1': 0.2, 'prerequisite_2': 0.01, 'final': 0.01},
+            failing=('prerequisite_2',)
+        )
+        with self.assertRaisesRegex(ValueError, 'prerequisite_2 failed'):
+            self._controller.run_deployment()
+        # give killed deployment chance to finish if it was not killed
+        time.sleep(0.3)
+        self.assertEqual(
+            events,
+            [('start', 'prerequisite_1'), ('start', 'prerequisite_2')]
+        )
+        self.assertEqual(self._controller._plan['finished'], set())
+
+    def test_deployment_unplanned(self):
+        """[Controller] Test deployment fails early on unplanned prereqs."""
+        self._controller.run_init(debug=True)
+        deployed = self._record_deploy()
+        self._controller._plan['dependency']['final'].add('missing')
+        with self.assertRaisesRegex(RuntimeError, 'not planned: missing'):
+            self._controller.run_deployment()
+        self.assertEqual(deployed, [])
+        self.assertEqual(self._controller._plan['finished'], set())
+
+    def test_deployment_cycle(self):
+        """[Controller] Test deployment reports cyclic dependency."""
+        self._controller.run_init(debug=True)
+        deployed = self._record_deploy()
+        plan = self._controller._plan
+        plan['dependency']['prerequisite_1'].add('final')
+        plan['dependents']['final'].add('prerequisite_1')
+        with self.assertRaisesRegex(
+                RuntimeError, 'cyclic dependency.*: final, prerequisite_1'):
+            self._controller.run_deployment()
+        self.assertEqual(deployed, ['prerequisite_2'])
+
+    def test_plugin_cache(self):
+        """[Controller] Test plugin data are shared between controllers."""
+        modules, data = load_plugin_data()
+        self.assertIs(data, self._controller._plugins)
+        self.assertIsInstance(modules, tuple)
+        self.assertIsInstance(data, tuple)
+        Controller.invalidate_plugin_cache()
+        modules, data = load_plugin_data()
+        self.assertIsNot(data, self._controller._plugins)
+        self.assertEqual([i.name for i in data], ['sql', 'nosql'])
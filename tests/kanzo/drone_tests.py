@@ -6,7 +6,7 @@ from __future__ import (absolute_import, division,
 import os
 import sys
 
-from kanzo.conf import Config
+from kanzo.conf import Config, project
 from kanzo.core.drones import Drone
 from kanzo.core.plugins import meta_builder
 from kanzo.utils import shell
@@ -129,3 +129,57 @@ class DroneTestCase(BaseTestCase):
             ('rm -f {self._tmpdir}/host-10.0.0.3/'
                 'transfer-\w{{8}}.tar.gz'.format(**_locals))
         ])
+
+    def test_drone_fact_cache(self):
+        """[Drone] Test caching of discovered host info"""
+        host = '10.0.0.2'
+        shell.RemoteShell.register_execute(
+            host, 'facter -p', 0, 'osfamily => RedHat', ''
+        )
+        orig = project.FACT_CACHE_DIR, project.FACT_CACHE_TIMEOUT
+        project.FACT_CACHE_DIR = os.path.join(self._tmpdir, 'facts')
+        try:
+            self.assertFalse(self._drone2.load_cached_info())
+            project.FACT_CACHE_TIMEOUT = 60
+            self.assertFalse(self._drone2.load_cached_info())
+            self._drone2.discover()
+            drone = Drone(
+                host, self._config, self._messages,
+                work_dir=self._tmpdir,
+                local_tmpdir=os.path.join(self._tmpdir, 'cached')
+            )
+            self.assertTrue(drone.load_cached_info())
+            self.assertEqual(drone.info['osfamily'], 'RedHat')
+            with self.assertRaises(TypeError):
+                drone.info['osfamily'] = 'Debian'
+            # cache is written atomically
+            self.assertEqual(
+                os.listdir(project.FACT_CACHE_DIR),
+                [os.path.basename(drone._get_fact_cache_path())]
+            )
+            # cache is keyed on connection, not only on host
+            path = drone._get_fact_cache_path()
+            drone._shell.username = 'other'
+            try:
+                self.assertNotEqual(drone._get_fact_cache_path(), path)
+            finally:
+                del drone._shell.username
+            # corrupted cache falls back to discovery
+            with open(path, 'w') as cache:
+                cache.write('{"osfamily": "Red')
+            drone = Drone(
+                host, self._config, self._messages,
+                work_dir=self._tmpdir,
+                local_tmpdir=os.path.join(self._tmpdir, 'corrupted')
+            )
+            self.assertFalse(drone.load_cached_info())
+            self.assertEqual(dict(drone.info), {})
+            # unwritable cache directory does not break discovery
+            blocker = os.path.join(self._tmpdir, 'blocker')
+            open(blocker, 'w').close()
+            project.FACT_CACHE_DIR = os.path.join(blocker, 'facts')
+            info = drone.discover()
+            self.assertEqual(info['osfamily'], 'RedHat')
+            self.assertFalse(drone.load_cached_info())
+        finally:
+            project.FACT_CACHE_DIR, project.FACT_CACHE_TIMEOUT = orig
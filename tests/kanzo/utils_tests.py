@@ -156,6 +156,8 @@ class UtilsTestCase(TestCase):
                              mask_list=["'text'"],
                              replace_list=[("'", "'\\''")])
         self.assertEqual(masked, 'test %s' % STR_MASK)
+        masked = mask_string('pass password', mask_list=['pass', 'password'])
+        self.assertEqual(masked, '{0} {0}'.format(STR_MASK))
         # test state_message
         msg = 'test'
         state = 'DONE'
@@ -163,6 +165,10 @@ class UtilsTestCase(TestCase):
         color_state = '[ \033[0;31mDONE\033[0m ]'
         self.assertEqual(state_message(msg, state, 'red'),
                          '{0}{1}'.format(msg, color_state.rjust(space)))
+        # color tags in message do not count to offset
+        msg = color_text('test', 'green')
+        self.assertEqual(state_message(msg, state, 'red'),
+                         '{0}{1}'.format(msg, color_state.rjust(space)))
 
     def test_shortcuts(self):
         """[Utils] Test shortcuts"""